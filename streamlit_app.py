@@ -1,10 +1,13 @@
 import streamlit as st
-from streamlit_webrtc import webrtc_streamer, VideoTransformerBase
+from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
 import cv2
-import os
 import base64
 import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Set up logging to log to a file and to the console
 logging.basicConfig(
@@ -13,64 +16,171 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
-class VideoTransformer(VideoTransformerBase):
+# Number of files uploaded to GitHub in parallel
+UPLOAD_WORKERS = 8
+
+
+class VideoTransformer(VideoProcessorBase):
     def __init__(self):
-        self.captured_frame = None
-        self.capture_flag = False
+        self._latest_frame = None
+        self._lock = threading.Lock()
 
-    def transform(self, frame):
-        img = frame.to_ndarray(format="bgr24")
-        if self.capture_flag:
-            self.captured_frame = img
-            self.capture_flag = False
-        return img
+    def recv(self, frame):
+        # Keep only the newest frame; it is converted when captured
+        with self._lock:
+            self._latest_frame = frame
+        return frame
 
     def capture_image(self):
-        self.capture_flag = True
+        """
+        Returns the most recent frame as a BGR array, or None if no frame
+        has arrived yet.
+        """
+        with self._lock:
+            frame = self._latest_frame
+        if frame is None:
+            return None
+        return frame.to_ndarray(format="bgr24")
 
 
-def upload_to_github(file_path, repo, branch, token, repo_path):
+@st.cache_resource
+def get_github_session(token):
     """
-    Uploads a single file to GitHub.
+    Returns a pooled, authenticated session reused for all GitHub API calls.
     """
-    try:
-        url = f"https://api.github.com/repos/{repo}/contents/{repo_path}"
-        headers = {
+    session = requests.Session()
+    session.headers.update(
+        {
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github.v3+json",
+            "Content-Type": "application/json",
         }
+    )
+    # Blob, tree and commit creation are content-addressed and re-pointing the
+    # ref to the same sha is harmless, so POST and PATCH are safe to retry
+    retries = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST", "PATCH"},
+    )
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4, pool_maxsize=UPLOAD_WORKERS, max_retries=retries
+        ),
+    )
+    return session
+
+
+def encode_jpeg(frame, quality=85):
+    """
+    Encodes a BGR frame as JPEG bytes in memory.
+    """
+    ok, buffer = cv2.imencode(
+        ".jpg",
+        frame,
+        [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1],
+    )
+    if not ok:
+        raise ValueError("Could not encode frame as JPEG")
+    return buffer.tobytes()
+
+
+def prep_sample(frame, max_side=512, quality=80):
+    """
+    Downscales a frame so its longest side is at most max_side and encodes it
+    as JPEG bytes ready for upload.
+    """
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(
+            frame,
+            (int(width * scale), int(height * scale)),
+            interpolation=cv2.INTER_AREA,
+        )
+    return encode_jpeg(frame, quality)
+
+
+def _create_blob(session, repo, content):
+    """
+    Uploads content as a Git blob and returns its sha.
+    """
+    # Base64 output never needs JSON escaping, so the request body is built
+    # around the encoded bytes directly instead of via str and json.dumps
+    body = b'{"encoding": "base64", "content": "%s"}' % base64.b64encode(content)
+
+    response = session.post(
+        f"https://api.github.com/repos/{repo}/git/blobs",
+        data=body,
+    )
+    response.raise_for_status()
+    return response.json()["sha"]
+
+
+def bulk_commit(session, repo, branch, files_data, message):
+    """
+    Commits all (repo_path, content) pairs to the branch as a single commit
+    using the Git Data API. Returns the new commit sha.
+    """
+    api_url = f"https://api.github.com/repos/{repo}/git"
+
+    # The branch endpoint returns the head commit and its tree in one call
+    response = session.get(f"https://api.github.com/repos/{repo}/branches/{branch}")
+    response.raise_for_status()
+    head_commit = response.json()["commit"]
+    base_sha = head_commit["sha"]
+    base_tree = head_commit["commit"]["tree"]["sha"]
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        blob_shas = list(
+            executor.map(
+                lambda file_data: _create_blob(session, repo, file_data[1]),
+                files_data,
+            )
+        )
+
+    tree = [
+        {"path": repo_path, "mode": "100644", "type": "blob", "sha": blob_sha}
+        for (repo_path, _), blob_sha in zip(files_data, blob_shas)
+    ]
+    response = session.post(
+        f"{api_url}/trees", json={"base_tree": base_tree, "tree": tree}
+    )
+    response.raise_for_status()
+    tree_sha = response.json()["sha"]
+
+    response = session.post(
+        f"{api_url}/commits",
+        json={"message": message, "tree": tree_sha, "parents": [base_sha]},
+    )
+    response.raise_for_status()
+    commit_sha = response.json()["sha"]
 
-        with open(file_path, "rb") as file:
-            content = file.read()
-        encoded_content = base64.b64encode(content).decode("utf-8")
-
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            file_sha = response.json().get("sha")
-            data = {
-                "message": f"Update {repo_path}",
-                "content": encoded_content,
-                "branch": branch,
-                "sha": file_sha,
-            }
-        else:
-            data = {
-                "message": f"Add {repo_path}",
-                "content": encoded_content,
-                "branch": branch,
-            }
-
-        response = requests.put(url, headers=headers, json=data)
-        if response.status_code in [200, 201]:
-            logging.info(f"Successfully uploaded {repo_path}")
-            return True
-        else:
-            logging.error(f"Failed to upload {repo_path}: {response.json()}")
-            return False
+    response = session.patch(
+        f"{api_url}/refs/heads/{branch}", json={"sha": commit_sha}
+    )
+    response.raise_for_status()
+    return commit_sha
+
+
+def upload_bulk_to_github(session, files_data, repo, branch, message):
+    """
+    Uploads (repo_path, content) pairs to GitHub in a single commit.
+    Returns the pairs that were uploaded successfully.
+    """
+    if not files_data:
+        return []
+
+    try:
+        commit_sha = bulk_commit(session, repo, branch, files_data, message)
+        logging.info(f"Successfully uploaded {len(files_data)} files in {commit_sha}")
+        return files_data
 
     except Exception as e:
-        logging.error(f"Error uploading file: {e}")
-        return False
+        logging.error(f"Error uploading files: {e}")
+        return []
 
 
 def main():
@@ -91,19 +201,25 @@ def main():
     branch = st.secrets.get("Branch", "main")
     token = st.secrets.get("TOKEN")
 
-    # Directory to store temporary images
-    temp_path = "captured_images"
-    os.makedirs(temp_path, exist_ok=True)
+    # Image settings trading dataset quality against upload time
+    st.sidebar.header("Image Settings")
+    max_side = st.sidebar.slider("Max image side (px)", 256, 1280, 512, step=64)
+    jpeg_quality = st.sidebar.slider("JPEG quality", 50, 95, 80, step=5)
 
-    # Initialize video transformer
-    if "video_transformer" not in st.session_state:
-        st.session_state["video_transformer"] = VideoTransformer()
+    # Encoded images waiting to be uploaded, as (repo_path, content) pairs
+    if "captured_images" not in st.session_state:
+        st.session_state["captured_images"] = []
+    if "capture_idx" not in st.session_state:
+        st.session_state["capture_idx"] = 0
 
     # WebRTC streamer
     webrtc_ctx = webrtc_streamer(
         key="example",
-        video_transformer_factory=lambda: st.session_state["video_transformer"],
-        media_stream_constraints={"video": True, "audio": False},
+        video_processor_factory=VideoTransformer,
+        media_stream_constraints={
+            "video": {"width": {"ideal": 640}, "height": {"ideal": 480}},
+            "audio": False,
+        },
     )
 
     # Capture image functionality
@@ -112,17 +228,18 @@ def main():
             st.error("Please provide Roll Number and Name.")
             return
 
-        if webrtc_ctx.video_transformer:
-            webrtc_ctx.video_transformer.capture_image()
-            if webrtc_ctx.video_transformer.captured_frame is not None:
-                image_name = f"{roll_number}_{len(os.listdir(temp_path)) + 1}.jpg"
-                image_path = os.path.join(temp_path, image_name)
-                cv2.imwrite(image_path, webrtc_ctx.video_transformer.captured_frame)
-                st.image(
-                    webrtc_ctx.video_transformer.captured_frame,
-                    caption=f"Captured Image: {image_name}",
+        if webrtc_ctx.video_processor:
+            captured_frame = webrtc_ctx.video_processor.capture_image()
+            if captured_frame is not None:
+                st.session_state["capture_idx"] += 1
+                image_name = f"{roll_number}_{st.session_state['capture_idx']}.jpg"
+                content = prep_sample(captured_frame, max_side, jpeg_quality)
+                st.session_state["captured_images"].append(
+                    (f"{roll_number}/{image_name}", content)
                 )
-                st.success(f"Image saved: {image_path}")
+                # Show the encoded JPEG so Streamlit doesn't re-encode a PNG
+                st.image(content, caption=f"Captured Image: {image_name}")
+                st.success(f"Image captured: {image_name}")
             else:
                 st.error("No image captured. Try again!")
 
@@ -132,33 +249,35 @@ def main():
             st.error("Please fill in all required fields.")
             return
 
-        uploaded_files = 0
-        for file_name in os.listdir(temp_path):
-            file_path = os.path.join(temp_path, file_name)
-            repo_path = f"{roll_number}/{file_name}"
-            if upload_to_github(file_path, repo, branch, token, repo_path):
-                os.remove(file_path)
-                uploaded_files += 1
+        captured_images = st.session_state["captured_images"]
+        with st.status(f"Uploading {len(captured_images)} images...") as status:
+            uploaded = upload_bulk_to_github(
+                get_github_session(token),
+                captured_images,
+                repo,
+                branch,
+                f"Add images for {roll_number}",
+            )
+            uploaded_files = len(uploaded)
 
-        if uploaded_files > 0:
-            st.success(f"Uploaded {uploaded_files} images to GitHub successfully!")
-        else:
-            st.error("No images uploaded. Check logs for details.")
+            if uploaded_files > 0:
+                st.session_state["captured_images"] = []
+                status.update(
+                    label=f"Uploaded {uploaded_files} images to GitHub successfully!",
+                    state="complete",
+                )
+            else:
+                status.update(
+                    label="No images uploaded. Check logs for details.",
+                    state="error",
+                )
 
-    # Clear temporary directory
+    # Clear captured images
     if st.button("Clear Captured Images"):
-        for file_name in os.listdir(temp_path):
-            os.remove(os.path.join(temp_path, file_name))
+        st.session_state["captured_images"] = []
+        st.session_state["capture_idx"] = 0
         st.success("Cleared all captured images.")
 
-    # Cleanup temporary directory after the session
-    if st.button("Cleanup Temporary Directory"):
-        try:
-            os.rmdir(temp_path)
-            st.success("Temporary directory cleaned up!")
-        except Exception as e:
-            st.warning(f"Error cleaning up temporary directory: {e}")
-
 
 if __name__ == "__main__":
     main()